@@ -65,6 +65,10 @@ class DatabaseSetup:
             CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status)
         """)
 
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_customers_status ON customers(status)
+        """)
+
         self.conn.commit()
         print("Tables created successfully!")
 
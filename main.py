@@ -1,6 +1,7 @@
 # main.py - A2A Client for Router Agent
 import os
-import requests
+import httpx
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -12,11 +13,26 @@ load_dotenv()
 # --- Configuration ---
 ROUTER_AGENT_URL = os.getenv("ROUTER_AGENT_URL", "http://127.0.0.1:9400")
 
+# One keep-alive connection pool to the Router for every request; endpoints
+# await it instead of blocking the event loop
+_router_client = httpx.AsyncClient(
+    base_url=ROUTER_AGENT_URL,
+    timeout=60.0,
+    limits=httpx.Limits(max_keepalive_connections=20)
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the Router connection pool on shutdown"""
+    yield
+    await _router_client.aclose()
+
 # --- FastAPI Setup ---
 api_app = FastAPI(
     title="A2A Client - Customer Support System",
     description="Client interface for A2A multi-agent customer support system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- Request/Response Models ---
@@ -28,7 +44,7 @@ class Response(BaseModel):
     messages: List[Dict[str, Any]]
 
 # --- A2A Client Functions ---
-def call_router_agent(query: str) -> Dict[str, Any]:
+async def call_router_agent(query: str) -> Dict[str, Any]:
     """Call Router Agent via A2A JSON-RPC protocol"""
     try:
         # JSON-RPC 2.0 format
@@ -41,11 +57,7 @@ def call_router_agent(query: str) -> Dict[str, Any]:
             "id": 1
         }
         
-        response = requests.post(
-            f"{ROUTER_AGENT_URL}/a2a/router",
-            json=payload,
-            timeout=60
-        )
+        response = await _router_client.post("/a2a/router", json=payload)
         response.raise_for_status()
         result = response.json()
         
@@ -61,7 +73,7 @@ def call_router_agent(query: str) -> Dict[str, Any]:
             result_data = result
         
         return result_data
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=503, detail=f"Failed to connect to Router Agent: {e}")
 
 # --- API Endpoints ---
@@ -74,15 +86,19 @@ def health():
         "description": "A2A Client for Multi-Agent Customer Support System"
     }
 
-@api_app.get("/agents")
-def list_agents():
-    """List available agents"""
-    agents = {
+# The agent directory never changes at runtime, so it is built once at import
+_AGENTS_PAYLOAD = {
+    "agents": {
         "router": f"{ROUTER_AGENT_URL}/a2a/router",
         "customer_data": "http://127.0.0.1:9300/a2a/customer_data",
         "support": "http://127.0.0.1:9301/a2a/support"
     }
-    return {"agents": agents}
+}
+
+@api_app.get("/agents")
+def list_agents():
+    """List available agents"""
+    return _AGENTS_PAYLOAD
 
 @api_app.post("/invoke", response_model=Response)
 async def invoke_router(request: QueryRequest):
@@ -91,7 +107,7 @@ async def invoke_router(request: QueryRequest):
     The Router Agent will coordinate with other agents as needed.
     """
     try:
-        result = call_router_agent(request.query)
+        result = await call_router_agent(request.query)
         
         response_content = result.get("content", "")
         messages = result.get("messages", [])
@@ -111,11 +127,7 @@ async def query_simple(request: QueryRequest):
     try:
         # Direct invocation format
         payload = {"query": request.query}
-        response = requests.post(
-            f"{ROUTER_AGENT_URL}/a2a/router",
-            json=payload,
-            timeout=60
-        )
+        response = await _router_client.post("/a2a/router", json=payload)
         response.raise_for_status()
         result = response.json()
         return result
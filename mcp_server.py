@@ -3,25 +3,70 @@
 # Agents connect to this server using LangGraph's MCP client integration
 import sqlite3
 import os
-from typing import Dict, Any
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List
 from fastapi import FastAPI, HTTPException
 import uvicorn
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- Configuration ---
 DB_PATH = "support.db"
 PORT = 8000
 
-app = FastAPI(title="MCP Customer Support Server", version="1.0.0")
-
 # --- Database Helper ---
+# FastAPI runs the sync endpoints on a worker thread pool; each worker keeps
+# one SQLite connection open for its lifetime instead of connecting per call.
+_thread_local = threading.local()
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Return this thread's SQLite connection (opened on first use, never closed by callers)"""
+    conn = getattr(_thread_local, "conn", None)
+    if conn is None:
+        conn = _thread_local.conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous = NORMAL")
     return conn
 
+# Indexes for the columns the tools filter on; created on startup so databases
+# built by an older database_setup.py get them too
+DB_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_tickets_customer_id ON tickets(customer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status)",
+    "CREATE INDEX IF NOT EXISTS idx_customers_status ON customers(status)",
+)
+
+def prepare_database():
+    """Create missing indexes and switch to WAL so readers don't wait on writers"""
+    if not os.path.exists(DB_PATH):
+        logger.warning("%s not found; run database_setup.py first (skipping index setup)", DB_PATH)
+        return
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {"customers", "tickets"} <= tables:
+            logger.warning("%s has no customers/tickets tables; run database_setup.py first (skipping index setup)", DB_PATH)
+            return
+        conn.execute("PRAGMA journal_mode = WAL")
+        for statement in DB_INDEXES:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare the database before serving requests"""
+    prepare_database()
+    yield
+
+app = FastAPI(title="MCP Customer Support Server", version="1.0.0", lifespan=lifespan)
+
 # --- MCP Tool Definitions (JSON Schema compliant) ---
 MCP_TOOLS = [
     {
@@ -40,7 +85,7 @@ MCP_TOOLS = [
     },
     {
         "name": "list_customers",
-        "description": "Lists customers. Can filter by status ('active' or 'disabled'). Uses customers.status field.",
+        "description": "Lists customers (id, name, email, phone, status; use get_customer for the full record). Can filter by status ('active' or 'disabled'). Uses customers.status field.",
         "inputSchema": {
             "type": "object",
             "properties": {
@@ -114,6 +159,25 @@ MCP_TOOLS = [
             },
             "required": ["customer_id"]
         }
+    },
+    {
+        "name": "get_customers_with_open_tickets",
+        "description": "Lists customers that have open tickets, each with its open tickets, in one call. Can filter by customer status ('active' or 'disabled'). Joins customers and tickets on tickets.customer_id.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "status": {
+                    "type": "string",
+                    "enum": ["active", "disabled"],
+                    "description": "Filter by customer status"
+                },
+                "limit": {
+                    "type": "integer",
+                    "default": 100,
+                    "description": "Maximum number of customers to return"
+                }
+            }
+        }
     }
 ]
 
@@ -135,23 +199,26 @@ def call_tool(request: Dict[str, Any]):
             raise HTTPException(status_code=400, detail="customer_id is required")
         conn = get_db_connection()
         customer = conn.execute("SELECT * FROM customers WHERE id = ?", (customer_id,)).fetchone()
-        conn.close()
         if not customer:
             raise HTTPException(status_code=404, detail=f"Customer {customer_id} not found")
         return {"result": dict(customer)}
     
     elif tool_name == "list_customers":
         status = arguments.get("status")
-        limit = arguments.get("limit", 100)
+        try:
+            limit = int(arguments.get("limit", 100))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="limit must be an integer")
         conn = get_db_connection()
-        query = "SELECT * FROM customers"
+        # List rows skip the timestamp columns; get_customer returns the full record
+        query = "SELECT id, name, email, phone, status FROM customers"
         params = []
         if status:
             query += " WHERE status = ?"
             params.append(status)
-        query += f" LIMIT {limit}"
+        query += " LIMIT ?"
+        params.append(limit)
         customers = conn.execute(query, params).fetchall()
-        conn.close()
         return {"result": [dict(c) for c in customers]}
     
     elif tool_name == "update_customer":
@@ -168,11 +235,11 @@ def call_tool(request: Dict[str, Any]):
         params = list(updates.values()) + [customer_id]
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        rows = cursor.rowcount
-        conn.close()
+        # Commit on success, roll back on any error: the connection outlives the
+        # request, so a failed write must not leave its transaction (and the
+        # write lock) open
+        with conn:
+            rows = conn.execute(query, params).rowcount
         
         if rows == 0:
             raise HTTPException(status_code=404, detail="Customer not found")
@@ -199,8 +266,6 @@ def call_tool(request: Dict[str, Any]):
         except Exception as e:
             conn.rollback()
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            conn.close()
     
     elif tool_name == "get_customer_history":
         customer_id = arguments.get("customer_id")
@@ -208,15 +273,79 @@ def call_tool(request: Dict[str, Any]):
             raise HTTPException(status_code=400, detail="customer_id is required")
         conn = get_db_connection()
         tickets = conn.execute("SELECT * FROM tickets WHERE customer_id = ?", (customer_id,)).fetchall()
-        conn.close()
         return {"result": [dict(t) for t in tickets]}
     
+    elif tool_name == "get_customers_with_open_tickets":
+        status = arguments.get("status")
+        try:
+            limit = int(arguments.get("limit", 100))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="limit must be an integer")
+        query = """
+            SELECT c.id, c.name, c.email, c.phone, c.status,
+                   t.id AS ticket_id, t.issue, t.priority, t.created_at AS ticket_created_at
+            FROM customers c
+            JOIN tickets t ON t.customer_id = c.id
+            WHERE t.status = 'open'
+        """
+        params = []
+        if status:
+            query += " AND c.status = ?"
+            params.append(status)
+        query += " ORDER BY c.id, t.id"
+        conn = get_db_connection()
+        rows = conn.execute(query, params).fetchall()
+        
+        # Group joined rows into one entry per customer
+        customers = {}
+        for row in rows:
+            customer = customers.get(row["id"])
+            if customer is None:
+                if len(customers) >= limit:
+                    break
+                customer = customers[row["id"]] = {
+                    "id": row["id"], "name": row["name"], "email": row["email"],
+                    "phone": row["phone"], "status": row["status"], "open_tickets": []
+                }
+            customer["open_tickets"].append({
+                "id": row["ticket_id"], "issue": row["issue"],
+                "priority": row["priority"], "created_at": row["ticket_created_at"]
+            })
+        return {"result": list(customers.values())}
+    
     else:
         raise HTTPException(
             status_code=404, 
             detail=f"Tool '{tool_name}' not found. Available tools: {[t['name'] for t in MCP_TOOLS]}"
         )
 
+@app.post("/mcp/batch")
+def call_tool_batch(requests: List[Dict[str, Any]]):
+    """MCP: Run a JSON-RPC batch of call_tool requests in order, one response per request.
+
+    Failures are reported per entry (code = the HTTP status call_tool would have
+    returned), so one bad call doesn't fail the rest of the batch.
+    """
+    responses = []
+    for request in requests:
+        request_id = request.get("id")
+        if request.get("method") != "call_tool":
+            responses.append({
+                "jsonrpc": "2.0",
+                "error": {"code": -32601, "message": f"Method '{request.get('method')}' not found"},
+                "id": request_id
+            })
+            continue
+        try:
+            result = call_tool(request.get("params", {}))
+            responses.append({"jsonrpc": "2.0", "result": result["result"], "id": request_id})
+        except HTTPException as e:
+            responses.append({"jsonrpc": "2.0", "error": {"code": e.status_code, "message": e.detail}, "id": request_id})
+        except Exception as e:
+            # What would have been an unhandled 500 for a single call_tool
+            responses.append({"jsonrpc": "2.0", "error": {"code": 500, "message": str(e)}, "id": request_id})
+    return responses
+
 # --- Startup ---
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -1,14 +1,87 @@
 # start_agents.py - Start all A2A agent servers using langgraph dev
 # When using langgraph dev, agents with messages key automatically expose /a2a/{assistant_id} endpoints
 import os
+import asyncio
 import subprocess
 import sys
+import logging
+import traceback
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import orjson
 from dotenv import load_dotenv
 
+try:
+    import uvloop
+except ImportError:  # optional: not available on Windows
+    uvloop = None
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Cap on graph runs in flight per agent server; further requests queue on the
+# event loop instead of piling more concurrent LLM calls onto the provider
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "32"))
+
+# Optional invoke params copied into the initial AgentState (see call_a2a_agent)
+STATE_PARAMS = ("data_context", "customer_id")
+
+def extract_state_params(params: dict) -> dict:
+    """Return the STATE_PARAMS present in invoke params, with customer_id coerced to int.
+    
+    Raises ValueError when customer_id is not a whole number.
+    """
+    fields = {field: params[field] for field in STATE_PARAMS if params.get(field) is not None}
+    if "customer_id" in fields:
+        customer_id = fields["customer_id"]
+        try:
+            if isinstance(customer_id, bool) or (isinstance(customer_id, float) and not customer_id.is_integer()):
+                raise ValueError
+            fields["customer_id"] = int(customer_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"customer_id must be an integer, got {customer_id!r}") from None
+    return fields
+
+# Shared immutable value for every card (serialised as a JSON list)
+AGENT_CAPABILITIES = ("invoke", "stream")
+
+# Bounded: the id comes from the request path, so arbitrary ids must not grow
+# the cache forever; the handful of real agents easily fit.
+@lru_cache(maxsize=16)
+def build_agent_card(agent_id: str) -> dict:
+    """Build the A2A Agent Card for an agent id (cached per id, then reused)"""
+    return {
+        "agent_id": agent_id,
+        "name": f"{agent_id.replace('_', ' ').title()} Agent",
+        "description": f"A2A-compatible {agent_id} agent",
+        "endpoint": f"/a2a/{agent_id}",
+        "capabilities": AGENT_CAPABILITIES
+    }
+
+def extract_request_text(request: dict) -> str:
+    """Pull the query text out of an A2A message/send, invoke or plain request body"""
+    method = request.get("method")
+    if method == "message/send":
+        parts = request.get("params", {}).get("message", {}).get("parts", [])
+        return parts[0].get("text", "") if parts else ""
+    if method == "invoke":
+        messages = request.get("params", {}).get("messages", [])
+        if not messages:
+            return ""
+        return messages[0].get("content", "") if isinstance(messages[0], dict) else str(messages[0])
+    return request.get("query", request.get("message", ""))
+
+def sse_event(payload: dict) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
 def main():
     """Start agents using langgraph dev (recommended) or fallback to manual servers"""
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
     print("=" * 70)
     print("Starting A2A Agent Servers")
     print("=" * 70)
@@ -37,39 +110,65 @@ def start_manual_servers():
         create_customer_data_agent,
         create_support_agent,
         create_router_agent,
+        warmup,
+        aclose_mcp_client,
+        aclose_a2a_client,
+        register_local_agent,
+        CLASSIFIER_TAG,
+        PEER_CALL_TAG,
+        A2A_TOKEN_EVENT,
     )
-    from fastapi import FastAPI
+    from fastapi import FastAPI, HTTPException
+    from fastapi.middleware.gzip import GZipMiddleware
+    from fastapi.responses import StreamingResponse
     from langchain_core.messages import HumanMessage
     
     # Create simple FastAPI servers for each agent
-    def create_simple_server(agent_id: str, agent_graph, port: int):
-        app = FastAPI(title=f"A2A {agent_id} Agent")
+    def create_simple_server(agent_id: str, agent_graph, port: int, warmup_kwargs=None):
+        # Warm the shared HTTP pools in the background once the loop is running,
+        # and close this loop's clients on shutdown
+        @asynccontextmanager
+        async def lifespan(app: FastAPI):
+            if warmup_kwargs is not None:
+                app.state.warmup_task = asyncio.create_task(warmup(**warmup_kwargs))
+            yield
+            await aclose_mcp_client()
+            await aclose_a2a_client()
+        
+        app = FastAPI(title=f"A2A {agent_id} Agent", lifespan=lifespan)
+        # Data-heavy replies (customer lists, ticket histories) are compressed;
+        # small JSON-RPC envelopes and SSE streams go out as-is
+        app.add_middleware(GZipMiddleware, minimum_size=1024)
+        run_slots = asyncio.Semaphore(AGENT_MAX_CONCURRENCY)
         
         @app.get("/a2a/{agent_id}")
         def get_agent_card(agent_id: str):
-            return {
-                "agent_id": agent_id,
-                "name": f"{agent_id.replace('_', ' ').title()} Agent",
-                "description": f"A2A-compatible {agent_id} agent",
-                "endpoint": f"/a2a/{agent_id}",
-                "capabilities": ["invoke"]
-            }
+            return build_agent_card(agent_id)
         
         @app.post("/a2a/{agent_id}")
-        def invoke_agent(agent_id: str, request: dict):
+        async def invoke_agent(agent_id: str, request: dict):
+            # Reject empty payloads before building any LangChain state
+            text = extract_request_text(request)
+            if not text or not text.strip():
+                return {
+                    "jsonrpc": "2.0",
+                    "error": {"code": -32602, "message": "No query or message content provided"},
+                    "id": request.get("id", "")
+                }
+            
+            state_fields = {}
+            if request.get("method") == "invoke":
+                try:
+                    state_fields = extract_state_params(request.get("params", {}))
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            
             try:
                 # Handle A2A message/send format
-                if "method" in request and request["method"] == "message/send":
-                    params = request.get("params", {})
-                    message = params.get("message", {})
-                    parts = message.get("parts", [])
-                    text = parts[0].get("text", "") if parts else ""
-                    
-                    if not text:
-                        raise ValueError("No text content found in message parts")
-                    
+                if request.get("method") == "message/send":
                     state = {"messages": [HumanMessage(content=text)]}
-                    result = agent_graph.invoke(state)
+                    async with run_slots:
+                        result = await agent_graph.ainvoke(state)
                     response_text = result['messages'][-1].content if result.get('messages') else "No response"
                     
                     return {
@@ -82,32 +181,13 @@ def start_manual_servers():
                         "id": request.get("id", "")
                     }
                 # Handle A2A invoke format (from test client)
-                elif "method" in request and request["method"] == "invoke":
-                    params = request.get("params", {})
-                    messages = params.get("messages", [])
-                    
-                    # Extract text from messages
-                    text = ""
-                    if messages:
-                        if isinstance(messages[0], dict):
-                            text = messages[0].get("content", "")
-                        else:
-                            text = str(messages[0])
-                    
-                    if not text:
-                        raise ValueError("No content found in messages")
-                    
-                    # Ensure we create a proper HumanMessage with content
-                    human_msg = HumanMessage(content=text)
-                    if not human_msg.content or not human_msg.content.strip():
-                        raise ValueError(f"Empty message content: {repr(text)}")
-                    
-                    state = {"messages": [human_msg]}
+                elif request.get("method") == "invoke":
+                    state = {"messages": [HumanMessage(content=text)], **state_fields}
                     
-                    # Debug: print state before invocation
-                    print(f"[DEBUG] Invoking agent {agent_id} with state: messages={len(state['messages'])}, content={state['messages'][0].content[:50]}...")
+                    logger.debug("Invoking agent %s with %d message(s): %.50s...", agent_id, len(state['messages']), text)
                     
-                    result = agent_graph.invoke(state)
+                    async with run_slots:
+                        result = await agent_graph.ainvoke(state)
                     
                     # Ensure result has messages
                     if not result.get('messages'):
@@ -125,16 +205,12 @@ def start_manual_servers():
                     }
                 else:
                     # Fallback format
-                    query = request.get("query", request.get("message", ""))
-                    if not query:
-                        raise ValueError("No query or message provided")
-                    
-                    state = {"messages": [HumanMessage(content=query)]}
-                    result = agent_graph.invoke(state)
+                    state = {"messages": [HumanMessage(content=text)]}
+                    async with run_slots:
+                        result = await agent_graph.ainvoke(state)
                     response_text = result['messages'][-1].content if result.get('messages') else "No response"
                     return {"response": response_text}
             except Exception as e:
-                import traceback
                 traceback.print_exc()
                 return {
                     "jsonrpc": "2.0",
@@ -142,6 +218,45 @@ def start_manual_servers():
                     "id": request.get("id", "")
                 }
         
+        @app.post("/a2a/{agent_id}/stream")
+        async def stream_agent(agent_id: str, request: dict):
+            """Stream the reply as SSE: "token" events as the model writes, then one "final" event"""
+            text = extract_request_text(request)
+            state_fields = {}
+            if request.get("method") == "invoke":
+                try:
+                    state_fields = extract_state_params(request.get("params", {}))
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            
+            async def events():
+                if not text or not text.strip():
+                    yield sse_event({"type": "error", "message": "No query or message provided"})
+                    return
+                response_text = "No response"
+                try:
+                    state = {"messages": [HumanMessage(content=text)], **state_fields}
+                    async with run_slots:
+                        async for event in agent_graph.astream_events(state, version="v2"):
+                            if event["event"] == "on_chat_model_stream":
+                                token = event["data"]["chunk"].content
+                                tags = event.get("tags", ())
+                                if token and isinstance(token, str) and CLASSIFIER_TAG not in tags and PEER_CALL_TAG not in tags:
+                                    yield sse_event({"type": "token", "text": token})
+                            # Tokens relayed from a peer agent's stream (router -> support)
+                            elif event["event"] == "on_custom_event" and event["name"] == A2A_TOKEN_EVENT:
+                                yield sse_event({"type": "token", "text": event["data"]["text"]})
+                            elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                                messages = event["data"]["output"].get("messages")
+                                if messages:
+                                    response_text = messages[-1].content
+                    yield sse_event({"type": "final", "text": response_text})
+                except Exception as e:
+                    traceback.print_exc()
+                    yield sse_event({"type": "error", "message": str(e)})
+            
+            return StreamingResponse(events(), media_type="text/event-stream")
+        
         return app, port
     
     # Create agents
@@ -149,6 +264,11 @@ def start_manual_servers():
     support_agent = create_support_agent()
     router_agent = create_router_agent()
     
+    # Peers live in this process, so the router calls their graphs directly
+    # instead of over loopback HTTP; their ports stay up for outside clients
+    register_local_agent("customer_data", customer_data_agent)
+    register_local_agent("support", support_agent)
+    
     print("\nStarting agents on ports 9300, 9301, 9400...")
     print("Customer Data Agent: http://127.0.0.1:9300/a2a/customer_data")
     print("Support Agent: http://127.0.0.1:9301/a2a/support")
@@ -156,27 +276,23 @@ def start_manual_servers():
     print("\nPress Ctrl+C to stop all servers")
     
     # Note: This is a simplified version. For production, use langgraph dev
-    import threading
-    
-    def run_server(app, port):
-        uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
-    
-    app1, port1 = create_simple_server("customer_data", customer_data_agent, 9300)
-    app2, port2 = create_simple_server("support", support_agent, 9301)
-    app3, port3 = create_simple_server("router", router_agent, 9400)
-    
-    t1 = threading.Thread(target=run_server, args=(app1, port1), daemon=True)
-    t2 = threading.Thread(target=run_server, args=(app2, port2), daemon=True)
-    t3 = threading.Thread(target=run_server, args=(app3, port3), daemon=True)
+    apps = [
+        create_simple_server("customer_data", customer_data_agent, 9300, {"mcp": True}),
+        create_simple_server("support", support_agent, 9301),
+        create_simple_server("router", router_agent, 9400),
+    ]
     
-    t1.start()
-    t2.start()
-    t3.start()
+    # All servers share one event loop, and with it the pooled MCP client and caches
+    async def serve_all():
+        servers = [uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=port, log_level="info")) for app, port in apps]
+        await asyncio.gather(*(server.serve() for server in servers))
     
     try:
-        while True:
-            import time
-            time.sleep(1)
+        # uvicorn only picks uvloop itself in uvicorn.run(); here the loop is ours
+        if uvloop is not None:
+            uvloop.run(serve_all())
+        else:
+            asyncio.run(serve_all())
     except KeyboardInterrupt:
         print("\nShutting down servers...")
 
@@ -1,8 +1,11 @@
 # test_client.py - Test client for A2A multi-agent system
 import os
+import json
+import threading
 import requests
 from dotenv import load_dotenv
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
 
 load_dotenv()
 
@@ -10,6 +13,17 @@ load_dotenv()
 CLIENT_URL = os.getenv("CLIENT_URL", "http://127.0.0.1:8500")
 ROUTER_URL = os.getenv("ROUTER_AGENT_URL", "http://127.0.0.1:9400")
 
+# One keep-alive session per thread (requests.Session isn't thread-safe), so
+# parallel mode's workers don't share one
+_thread_local = threading.local()
+
+def get_session() -> requests.Session:
+    """Return this thread's requests session (created on first use)"""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+    return session
+
 # --- Test Scenarios (Matching Assignment Requirements) ---
 TEST_QUERIES = {
     "Simple Query": "Get customer information for ID 5",
@@ -22,7 +36,7 @@ TEST_QUERIES = {
 def call_agent_via_client(query: str) -> Dict[str, Any]:
     """Call agent via main client"""
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{CLIENT_URL}/invoke",
             json={"query": query},
             timeout=60
@@ -43,7 +57,7 @@ def call_router_direct(query: str) -> Dict[str, Any]:
             },
             "id": 1
         }
-        response = requests.post(
+        response = get_session().post(
             f"{ROUTER_URL}/a2a/router",
             json=payload,
             timeout=60
@@ -53,7 +67,37 @@ def call_router_direct(query: str) -> Dict[str, Any]:
     except Exception as e:
         return {"error": str(e)}
 
-def run_test_scenario(query: str, test_name: str, use_client: bool = True) -> None:
+def stream_router_direct(query: str) -> Dict[str, Any]:
+    """Call the router's SSE stream endpoint, printing reply tokens as they arrive"""
+    payload = {
+        "jsonrpc": "2.0",
+        "method": "invoke",
+        "params": {
+            "messages": [{"role": "user", "content": query}]
+        },
+        "id": 1
+    }
+    try:
+        with get_session().post(f"{ROUTER_URL}/a2a/router/stream", json=payload, timeout=60, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                if event["type"] == "token":
+                    print(event["text"], end="", flush=True)
+                elif event["type"] == "final":
+                    print()
+                    return {"result": {"content": event["text"], "messages": []}}
+                elif event["type"] == "error":
+                    print()
+                    return {"error": event["message"]}
+        return {"error": "Stream ended without a final event"}
+    except Exception as e:
+        return {"error": str(e)}
+
+def run_test_scenario(query: str, test_name: str, use_client: bool = True, stream: bool = False,
+                      result: Optional[Dict[str, Any]] = None) -> None:
     """
     Run a test scenario and print results.
     
@@ -61,6 +105,8 @@ def run_test_scenario(query: str, test_name: str, use_client: bool = True) -> No
         query: The test query
         test_name: Name of the test scenario
         use_client: If True, use main client; if False, call router directly
+        stream: If True, stream the router's reply (implies a direct router call)
+        result: Response already fetched for this query (parallel runs); skips the call
     """
     print("=" * 70)
     print(f"Scenario: {test_name}")
@@ -68,10 +114,12 @@ def run_test_scenario(query: str, test_name: str, use_client: bool = True) -> No
     print("-" * 70)
     
     try:
-        if use_client:
-            result = call_agent_via_client(query)
-        else:
-            result = call_router_direct(query)
+        if stream:
+            print("--- Streaming Reply ---")
+            result = stream_router_direct(query)
+            use_client = False
+        elif result is None:
+            result = call_agent_via_client(query) if use_client else call_router_direct(query)
         
         if "error" in result:
             print(f"❌ ERROR: {result['error']}")
@@ -115,18 +163,25 @@ def run_test_scenario(query: str, test_name: str, use_client: bool = True) -> No
     
     print("=" * 70 + "\n")
 
-def run_all_tests(use_client: bool = True):
-    """Run all predefined test scenarios"""
+def run_all_tests(use_client: bool = True, stream: bool = False, parallel: bool = False):
+    """Run all predefined test scenarios (parallel: send every query at once, then print in order)"""
     print("\n" + "=" * 70)
     print("STARTING A2A MULTI-AGENT SYSTEM TESTS")
     print("=" * 70)
     print(f"Client URL: {CLIENT_URL}")
     print(f"Router URL: {ROUTER_URL}")
-    print(f"Using {'Client API' if use_client else 'Direct Router'} endpoint")
+    print(f"Using {'Streaming Router' if stream else 'Client API' if use_client else 'Direct Router'} endpoint")
     print("=" * 70 + "\n")
     
-    for name, query in TEST_QUERIES.items():
-        run_test_scenario(query, name, use_client)
+    if parallel:
+        call = call_agent_via_client if use_client else call_router_direct
+        with ThreadPoolExecutor(max_workers=len(TEST_QUERIES)) as pool:
+            results = list(pool.map(call, TEST_QUERIES.values()))
+        for (name, query), result in zip(TEST_QUERIES.items(), results):
+            run_test_scenario(query, name, use_client, result=result)
+    else:
+        for name, query in TEST_QUERIES.items():
+            run_test_scenario(query, name, use_client, stream)
     
     print("=" * 70)
     print("ALL TESTS COMPLETE")
@@ -146,7 +201,7 @@ def check_services():
     
     for name, url in services.items():
         try:
-            response = requests.get(url, timeout=5)
+            response = get_session().get(url, timeout=5)
             if response.status_code == 200:
                 print(f"✅ {name}: Running")
             else:
@@ -161,13 +216,16 @@ if __name__ == "__main__":
     
     if len(sys.argv) > 1 and sys.argv[1] == "check":
         check_services()
+    elif len(sys.argv) > 1 and sys.argv[1] == "stream":
+        run_all_tests(use_client=False, stream=True)
     else:
+        parallel = len(sys.argv) > 1 and sys.argv[1] == "parallel"
         # Try client first, fallback to direct router
         try:
-            response = requests.get(f"{CLIENT_URL}/", timeout=2)
+            response = get_session().get(f"{CLIENT_URL}/", timeout=2)
             use_client = True
-        except:
+        except requests.RequestException:
             print(f"Client not available at {CLIENT_URL}, using direct router calls")
             use_client = False
         
-        run_all_tests(use_client=use_client)
+        run_all_tests(use_client=use_client, parallel=parallel)
@@ -0,0 +1,91 @@
+# test_direct_query.py - Unit tests for the data agent's direct (no-LLM) query matchers
+# Run with: python -m pytest test_direct_query.py
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+from a2a_agents import confident_keyword_route, extract_customer_id, match_direct_query
+
+
+def direct(query):
+    return match_direct_query(query, extract_customer_id(query))
+
+# --- extract_customer_id ---
+def test_explicit_customer_ids():
+    assert extract_customer_id("Get customer 5") == 5
+    assert extract_customer_id("Customer ID: 12 here") == 12
+    assert extract_customer_id("cust-4 please") == 4
+    assert extract_customer_id("customer_id 8") == 8
+
+def test_bare_id_is_a_fallback_only():
+    assert extract_customer_id("Get customer information for ID 5") == 5
+    assert extract_customer_id("Get customer information for ID 5", explicit_only=True) is None
+
+def test_ticket_and_order_ids_are_not_customer_ids():
+    assert extract_customer_id("Show me the status of ticket ID 3") is None
+    assert extract_customer_id("Where is order id 7?") is None
+    assert extract_customer_id("I'm customer 5, ticket ID 3 is still open") == 5
+
+def test_quantities_are_not_customer_ids():
+    assert extract_customer_id("I've been a customer 10 years and want a discount") is None
+    assert extract_customer_id("Customer for 3 months, how do I upgrade?") is None
+    assert extract_customer_id("customer 12 days ago I opened a ticket") is None
+    assert extract_customer_id("customer 5 has 3 tickets") == 5
+
+# --- match_direct_query ---
+def test_single_reads_take_the_fast_path():
+    assert direct("Get customer 5") == [("get_customer", {"customer_id": 5})]
+    assert direct("Show ticket history for customer ID 5") == [("get_customer_history", {"customer_id": 5})]
+    assert direct("Show me customer 5's info, please") == [("get_customer", {"customer_id": 5})]
+    assert direct("Get customer 5 history") == [("get_customer_history", {"customer_id": 5})]
+    assert direct("Show active customers with open tickets") == [
+        ("get_customers_with_open_tickets", {"status": "active"})
+    ]
+    assert direct("Show me all active customers who have open tickets") == [
+        ("get_customers_with_open_tickets", {"status": "active"})
+    ]
+
+def test_extra_clauses_and_filters_go_to_the_llm():
+    assert direct("Get customer 5's phone, disable their login") is None
+    assert direct("Show tickets for customer 5, escalate them to high priority") is None
+    assert direct("Show me customer 5 history for last week only") is None
+    assert direct("Show customers with open tickets sorted by priority") is None
+    assert direct("Get customer 5 and customer 6") is None
+    assert direct("Show tickets for customer 5 and customer 6") is None
+
+def test_specific_ticket_questions_go_to_the_llm():
+    assert direct("Show me the status of ticket ID 3") is None
+    assert direct("What is the status of ticket 3 for customer 5?") is None
+
+def test_bare_id_goes_to_the_llm():
+    assert direct("Get customer information for ID 5") is None
+    assert direct("Show tickets for ID 5") is None
+
+def test_negated_queries_go_to_the_llm():
+    assert direct("Show active customers without open tickets") is None
+    assert direct("Show customers that have no open tickets") is None
+    assert direct("Get customer 5 but not the ticket history") is None
+    assert direct("I don't need tickets, get customer 5") is None
+
+def test_email_update_template():
+    assert direct("I'm customer 5. Update my email to a@b.com and show my ticket history") == [
+        ("update_customer", {"customer_id": 5, "email": "a@b.com"}),
+        ("get_customer_history", {"customer_id": 5}),
+    ]
+    assert direct("Update my email to a@b.com for ID 5") is None
+    assert direct("Update my email to a@b.com for customer 5, then disable my account") is None
+    assert direct("Update my email to a@b.com for customer 5 and show customer 6 tickets") is None
+    assert direct("Don't update my email to a@b.com for customer 5") is None
+
+# --- confident_keyword_route ---
+def route(query):
+    return confident_keyword_route(query, extract_customer_id(query))
+
+def test_single_clause_queries_route_confidently():
+    assert route("Get customer 5") == "DATA"
+    assert route("Show active customers with open tickets") == "DATA"
+
+def test_second_clauses_go_to_the_classifier():
+    assert route("Get customer 5's phone, disable their login") is None
+    assert route("Show tickets for customer 5, escalate them to high priority") is None
+    assert route("Show customer 5 tickets and then escalate") is None
@@ -0,0 +1,16 @@
+# test_start_agents.py - Unit tests for agent server request handling
+# Run with: python -m pytest test_start_agents.py
+import pytest
+
+from start_agents import extract_state_params
+
+
+def test_customer_id_is_coerced_to_int():
+    assert extract_state_params({"customer_id": "5"}) == {"customer_id": 5}
+    assert extract_state_params({"customer_id": 5.0, "data_context": "ctx"}) == {"customer_id": 5, "data_context": "ctx"}
+    assert extract_state_params({"customer_id": None, "other": 1}) == {}
+
+@pytest.mark.parametrize("customer_id", ["abc", "5.5", 5.5, True, [5], {"id": 5}])
+def test_invalid_customer_id_is_rejected(customer_id):
+    with pytest.raises(ValueError, match="customer_id must be an integer"):
+        extract_state_params({"customer_id": customer_id})